@@ -2,7 +2,7 @@ from typing import Dict, Any, Optional, List
 from datetime import datetime
 from dataclasses import dataclass
 import uuid
-from logs.log import logger, set_trace_id
+from logs.log import logger, set_trace_id, get_trace_id
 from metrics.prometheus import cached_messages_gauge
 
 
@@ -52,7 +52,8 @@ class CacheManager:
     
     def create_chat_session(self, chat_id: str, user_id: str, session_id: str) -> ChatSession:
         """Create new chat session in cache"""
-        trace_id = set_trace_id()
+        set_trace_id()
+        trace_id = get_trace_id()
         
         session = ChatSession(
             chat_id=chat_id,
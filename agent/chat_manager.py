@@ -1,7 +1,6 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta
 from database.client import run_query
-from database.utils import pg_escape
 from logs.log import logger
 from config import settings
 import uuid
@@ -57,22 +56,17 @@ class ChatSessionManager:
         chat_id = self.generate_chat_id()
         session_id = self.generate_session_id()
         
-        insert_query = f"""
+        insert_query = """
         INSERT INTO chats (chat_id, user_id, topic, total_tokens, is_active, created_at, updated_at)
-        VALUES (
-            '{chat_id}',
-            '{pg_escape(user_id)}',
-            {f"'{pg_escape(topic)}'" if topic else 'NULL'},
-            0,
-            true,
-            NOW(),
-            NOW()
-        )
+        VALUES (%s, %s, %s, 0, true, NOW(), NOW())
         RETURNING chat_id;
         """
-        
+
         try:
-            await run_query(insert_query, access_token, refresh_token)
+            await run_query(
+                insert_query, access_token, refresh_token,
+                params=(chat_id, user_id, topic)
+            )
             logger.info(f"chat_created_db - chat_id={chat_id}")
             
             self.active_chats[chat_id] = {
@@ -129,27 +123,31 @@ class ChatSessionManager:
         logger.info(f"chat_cache_miss_loading - chat_id={chat_id}")
         
         # Load chat metadata
-        chat_query = f"""
+        chat_query = """
         SELECT chat_id, topic, total_tokens, created_at
         FROM chats
-        WHERE chat_id = '{pg_escape(chat_id)}'
-        AND user_id = '{pg_escape(user_id)}';
+        WHERE chat_id = %s
+        AND user_id = %s;
         """
-        
-        chat_result = await run_query(chat_query, access_token, refresh_token)
+
+        chat_result = await run_query(
+            chat_query, access_token, refresh_token, params=(chat_id, user_id)
+        )
         
         if not chat_result:
             raise ValueError(f"Chat {chat_id} not found")
         
         # Load messages
-        messages_query = f"""
+        messages_query = """
         SELECT session_id, role, content, tokens, created_at
         FROM messages
-        WHERE chat_id = '{pg_escape(chat_id)}'
+        WHERE chat_id = %s
         ORDER BY created_at ASC;
         """
-        
-        messages_result = await run_query(messages_query, access_token, refresh_token)
+
+        messages_result = await run_query(
+            messages_query, access_token, refresh_token, params=(chat_id,)
+        )
         
         # Calculate tokens
         cumulative_input = sum(msg['tokens'] for msg in messages_result if msg['role'] == 'user')
@@ -323,31 +321,34 @@ class ChatSessionManager:
             return 0
         
         try:
-            # Batch insert messages
-            values = []
+            # Batch insert messages (placeholders per row, values bound as params)
+            params: List[Any] = []
             for msg in unsaved:
-                values.append(
-                    f"('{chat_id}', '{msg['session_id']}', '{pg_escape(msg['role'])}', "
-                    f"'{pg_escape(msg['content'])}', {msg['tokens']}, '{msg['created_at'].isoformat()}')"
-                )
-            
+                params.extend([
+                    chat_id, msg['session_id'], msg['role'],
+                    msg['content'], msg['tokens'], msg['created_at']
+                ])
+
             insert_query = f"""
             INSERT INTO messages (chat_id, session_id, role, content, tokens, created_at)
-            VALUES {', '.join(values)};
+            VALUES {', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(unsaved))};
             """
-            
-            await run_query(insert_query, access_token, refresh_token)
-            
+
+            await run_query(insert_query, access_token, refresh_token, params=params)
+
             # Update chat total_tokens
             cumulative_total = chat_data['cumulative_tokens']['total']
-            
-            update_query = f"""
+
+            update_query = """
             UPDATE chats
-            SET total_tokens = {cumulative_total}, updated_at = NOW()
-            WHERE chat_id = '{chat_id}';
+            SET total_tokens = %s, updated_at = NOW()
+            WHERE chat_id = %s;
             """
-            
-            await run_query(update_query, access_token, refresh_token)
+
+            await run_query(
+                update_query, access_token, refresh_token,
+                params=(cumulative_total, chat_id)
+            )
             
             # Clear unsaved messages
             saved_count = len(unsaved)
@@ -409,7 +410,7 @@ class ChatSessionManager:
         cost_per_message = estimated_cost_usd / message_count if message_count > 0 else 0
         
         # FIX: Use INSERT ... ON CONFLICT to prevent duplicate key errors
-        metrics_query = f"""
+        metrics_query = """
         INSERT INTO chat_metrics (
             chat_id,
             session_id,
@@ -430,22 +431,7 @@ class ChatSessionManager:
             created_at,
             updated_at
         ) VALUES (
-            '{chat_id}',
-            '{chat_data['session_id']}',
-            {tokens['input']},
-            {tokens['output']},
-            {tokens['total']},
-            {total_latency},
-            {avg_latency},
-            {min_latency},
-            {max_latency},
-            {message_count},
-            {tool_count},
-            {error_count},
-            {estimated_cost_usd},
-            {cost_per_message},
-            '{session_start.isoformat()}',
-            '{session_end.isoformat()}',
+            %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
             NOW(),
             NOW()
         )
@@ -465,8 +451,18 @@ class ChatSessionManager:
         """
         
         try:
-            await run_query(metrics_query, access_token, refresh_token)
-            
+            await run_query(
+                metrics_query, access_token, refresh_token,
+                params=(
+                    chat_id, chat_data['session_id'],
+                    tokens['input'], tokens['output'], tokens['total'],
+                    total_latency, avg_latency, min_latency, max_latency,
+                    message_count, tool_count, error_count,
+                    estimated_cost_usd, cost_per_message,
+                    session_start, session_end
+                )
+            )
+
             # Mark as saved
             self.metrics_saved[chat_id] = True
             
@@ -504,34 +500,42 @@ class ChatSessionManager:
         user_id: str,
         access_token: str,
         refresh_token: str,
-        limit: int = 50
-    ) -> List[Dict[str, Any]]:
-        """Load chat list for user"""
-        
-        query = f"""
-        SELECT 
+        limit: int = 50,
+        offset: int = 0
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """Load a page of the chat list for user, plus the total chat count"""
+
+        query = """
+        SELECT
             c.chat_id,
             c.topic,
             c.total_tokens,
             c.is_active,
             c.created_at,
             c.updated_at,
-            COUNT(m.message_id) as message_count
+            COUNT(m.message_id) as message_count,
+            COUNT(*) OVER () as history_total
         FROM chats c
         LEFT JOIN messages m ON c.chat_id = m.chat_id
-        WHERE c.user_id = '{pg_escape(user_id)}'
+        WHERE c.user_id = %s
         GROUP BY c.chat_id, c.topic, c.total_tokens, c.is_active, c.created_at, c.updated_at
         ORDER BY c.updated_at DESC
-        LIMIT {limit};
+        LIMIT %s OFFSET %s;
         """
-        
+
         try:
-            chats = await run_query(query, access_token, refresh_token)
+            chats = await run_query(
+                query, access_token, refresh_token, params=(user_id, limit, offset)
+            )
+            # The window count rides along on every row; lift it out once
+            total = chats[0].get("history_total", len(chats)) if chats else 0
+            for chat in chats:
+                chat.pop("history_total", None)
             logger.info(f"chat_history_loaded - user_id={user_id[:8]}..., count={len(chats)}")
-            return chats
+            return chats, total
         except Exception as e:
             logger.error(f"chat_history_error - error={e}", exc_info=True)
-            return []
+            return [], 0
     
     async def load_chat_messages(
         self,
@@ -539,20 +543,34 @@ class ChatSessionManager:
         user_id: str,
         access_token: str,
         refresh_token: str,
-        limit: int = 100
+        limit: int = 100,
+        since: Optional[str] = None
     ) -> List[Dict[str, Any]]:
-        """Load messages for a chat"""
-        
-        query = f"""
-        SELECT role, content, tokens, created_at
-        FROM messages
-        WHERE chat_id = '{pg_escape(chat_id)}'
-        ORDER BY created_at ASC
-        LIMIT {limit};
-        """
-        
+        """Load messages for a chat, optionally only those after `since`"""
+
+        if since:
+            query = """
+            SELECT role, content, message_id, created_at
+            FROM messages
+            WHERE chat_id = %s AND created_at > %s
+            ORDER BY created_at ASC
+            LIMIT %s;
+            """
+            params = (chat_id, since, limit)
+        else:
+            query = """
+            SELECT role, content, message_id, created_at
+            FROM messages
+            WHERE chat_id = %s
+            ORDER BY created_at ASC
+            LIMIT %s;
+            """
+            params = (chat_id, limit)
+
         try:
-            messages = await run_query(query, access_token, refresh_token)
+            messages = await run_query(
+                query, access_token, refresh_token, params=params
+            )
             return messages
         except Exception as e:
             logger.error(f"load_messages_error - error={e}", exc_info=True)
@@ -572,8 +590,8 @@ class ChatSessionManager:
     ) -> Dict[str, Any]:
         """Get aggregate metrics for a user"""
         
-        query = f"""
-        SELECT 
+        query = """
+        SELECT
             COUNT(DISTINCT c.chat_id) as total_chats,
             COALESCE(SUM(cm.message_count), 0) as total_messages,
             COALESCE(SUM(cm.total_tokens), 0) as total_tokens,
@@ -584,11 +602,13 @@ class ChatSessionManager:
             MAX(cm.session_end) as last_activity
         FROM chats c
         LEFT JOIN chat_metrics cm ON c.chat_id = cm.chat_id
-        WHERE c.user_id = '{pg_escape(user_id)}';
+        WHERE c.user_id = %s;
         """
-        
+
         try:
-            result = await run_query(query, access_token, refresh_token)
+            result = await run_query(
+                query, access_token, refresh_token, params=(user_id,)
+            )
             if result:
                 return result[0]
             return {}
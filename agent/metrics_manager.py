@@ -3,7 +3,6 @@ from datetime import datetime
 from collections import defaultdict
 from logs.log import logger
 from database.client import run_query
-from database.utils import pg_escape
 import asyncio
 
 
@@ -173,26 +172,25 @@ class MetricsManager:
             return 0
         
         try:
-            # Batch insert metrics
-            values = []
+            # Batch insert metrics (placeholders per row, values bound as params)
+            params: List[Any] = []
             for metric in unsaved:
                 metric_type = metric['type']
                 metric_data = {k: v for k, v in metric.items() if k not in ['type', 'timestamp']}
-                
-                values.append(
-                    f"('{chat_id}', '{metric_type}', '{pg_escape(str(metric_data))}', "
-                    f"'{metric['timestamp'].isoformat()}')"
-                )
-            
-            if not values:
+
+                params.extend([
+                    chat_id, metric_type, str(metric_data), metric['timestamp']
+                ])
+
+            if not params:
                 return 0
-            
+
             insert_query = f"""
             INSERT INTO chat_metrics_detailed (chat_id, metric_type, metric_data, created_at)
-            VALUES {', '.join(values)};
+            VALUES {', '.join(['(%s, %s, %s, %s)'] * len(unsaved))};
             """
-            
-            await run_query(insert_query, access_token, refresh_token)
+
+            await run_query(insert_query, access_token, refresh_token, params=params)
             
             # Clear unsaved metrics
             pushed_count = len(unsaved)
@@ -217,14 +215,16 @@ class MetricsManager:
     ) -> Dict[str, Any]:
         """Load metrics from database"""
         try:
-            query = f"""
+            query = """
             SELECT metric_type, metric_data, created_at
             FROM chat_metrics_detailed
-            WHERE chat_id = '{pg_escape(chat_id)}'
+            WHERE chat_id = %s
             ORDER BY created_at ASC;
             """
-            
-            results = await run_query(query, access_token, refresh_token)
+
+            results = await run_query(
+                query, access_token, refresh_token, params=(chat_id,)
+            )
             
             # Reconstruct cache from DB
             metrics_cache = {
@@ -273,8 +273,8 @@ class MetricsManager:
     ) -> Dict[str, Any]:
         """Get aggregate metrics for a user across all chats"""
         try:
-            query = f"""
-            SELECT 
+            query = """
+            SELECT
                 COUNT(DISTINCT c.chat_id) as total_chats,
                 SUM(c.total_tokens) as total_tokens,
                 COUNT(m.message_id) as total_messages,
@@ -284,11 +284,13 @@ class MetricsManager:
             FROM chats c
             LEFT JOIN messages m ON c.chat_id = m.chat_id
             LEFT JOIN chat_metrics cm ON c.chat_id = cm.chat_id
-            WHERE c.user_id = '{pg_escape(user_id)}'
+            WHERE c.user_id = %s
             GROUP BY c.user_id;
             """
-            
-            results = await run_query(query, access_token, refresh_token)
+
+            results = await run_query(
+                query, access_token, refresh_token, params=(user_id,)
+            )
             
             if results:
                 return results[0]
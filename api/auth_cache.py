@@ -0,0 +1,91 @@
+from cachetools import TTLCache
+from config import settings
+from typing import Dict, Any
+import base64
+import hashlib
+import hmac
+import jwt
+import orjson
+import threading
+import time
+
+
+# Shared cache of verified JWT claims, consulted by both the API routes and
+# the database layer so one verification serves every consumer in the
+# process. Entries are keyed by a short blake2b digest of the token (bounds
+# key size) and live for at most _CACHE_TTL_SECONDS or until the token's own
+# exp claim passes, whichever comes first - so a cache hit can never outlive
+# the token. On a hit the HMAC and JSON parse are skipped entirely.
+_CACHE_TTL_SECONDS = 300
+
+_jwt_cache: TTLCache = TTLCache(maxsize=10000, ttl=_CACHE_TTL_SECONDS)
+
+# TTLCache mutates its expiry linked list even on reads, and the cache is
+# hit both from the event loop and from run_in_threadpool workers (the
+# database layer), so every access goes through this lock. The guarded
+# section is a dict probe - the HMAC verification runs outside it.
+_jwt_cache_lock = threading.Lock()
+
+# Key bytes derived once: jwt.decode re-builds the HMAC key object per call
+_jwt_key_bytes = settings.JWT_SECRET.encode()
+
+
+def _cache_key(token: str) -> bytes:
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+
+def _b64url_decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def _verify_hs256(token: str) -> Dict[str, Any]:
+    """Hand-rolled HS256 verification for the fixed algorithm used here.
+
+    One hmac.new() call (OpenSSL's SHA-256) plus an orjson payload parse,
+    skipping PyJWT's per-call algorithm registry lookup and stdlib json.
+    exp and aud are validated inline to match the jwt.decode semantics the
+    callers rely on; a token signed under any other algorithm simply fails
+    the HMAC comparison.
+    """
+    try:
+        header_b64, payload_b64, sig_b64 = token.split(".")
+        expected = hmac.new(
+            _jwt_key_bytes,
+            f"{header_b64}.{payload_b64}".encode(),
+            hashlib.sha256
+        ).digest()
+        if not hmac.compare_digest(expected, _b64url_decode(sig_b64)):
+            raise jwt.InvalidSignatureError("Signature verification failed")
+        claims = orjson.loads(_b64url_decode(payload_b64))
+    except jwt.InvalidTokenError:
+        raise
+    except Exception:
+        raise jwt.DecodeError("Malformed token")
+
+    if claims.get("exp", 0) < time.time():
+        raise jwt.ExpiredSignatureError("Signature has expired")
+
+    aud = claims.get("aud")
+    if "authenticated" not in (aud if isinstance(aud, list) else [aud]):
+        raise jwt.InvalidAudienceError("Audience doesn't match")
+
+    return claims
+
+
+def decode_jwt_claims(token: str) -> Dict[str, Any]:
+    """Decode and verify JWT, caching claims by token hash to skip repeat verification"""
+    key = _cache_key(token)
+    with _jwt_cache_lock:
+        decoded = _jwt_cache.get(key)
+    if decoded is None or decoded.get("exp", 0) < time.time():
+        decoded = _verify_hs256(token)
+        with _jwt_cache_lock:
+            _jwt_cache[key] = decoded
+    return decoded
+
+
+def invalidate_token(token: str):
+    """Drop a token's cached claims (call on logout/refresh so a rotated
+    token can't keep serving from cache)"""
+    with _jwt_cache_lock:
+        _jwt_cache.pop(_cache_key(token), None)
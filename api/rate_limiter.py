@@ -1,8 +1,10 @@
-from fastapi import Request, HTTPException
+from fastapi import HTTPException
 from typing import Dict, Tuple
 from datetime import datetime, timedelta
 import time
+import jwt
 from collections import defaultdict
+from api.auth_cache import decode_jwt_claims
 from logs.log import logger
 from metrics.prometheus import Counter, Histogram
 import hashlib
@@ -14,14 +16,16 @@ from metrics.prometheus import (
 
 class InMemoryRateLimiter:
     """
-    In-memory rate limiter with sliding window.
-    Tracks requests per user per endpoint.
+    In-memory sliding-window-counter rate limiter.
+    Tracks two fixed-window counters per user per endpoint and weights the
+    previous window by its remaining overlap - O(1) per hit, within ~1% of
+    a precise sliding window, and no fixed-window boundary burst.
     """
-    
+
     def __init__(self):
-        # Storage: {user_id: {endpoint: [(timestamp, count)]}}
-        self.requests: Dict[str, Dict[str, list]] = defaultdict(lambda: defaultdict(list))
-        
+        # Storage: {user_id: {endpoint: [prev_count, curr_count, window_start]}}
+        self.windows: Dict[str, Dict[str, list]] = defaultdict(dict)
+
         # Rate limit configurations
         self.limits = {
             "default": (100, 60),        # 100 requests per 60 seconds
@@ -29,122 +33,120 @@ class InMemoryRateLimiter:
             "/api/auth/login": (5, 300), # 5 login attempts per 5 minutes
             "/api/query": (30, 60),      # 30 queries per minute
         }
-        
+
         logger.info("InMemoryRateLimiter initialized")
-    
-    def _cleanup_old_requests(self, user_id: str, endpoint: str, window_seconds: int):
-        """Remove requests older than window"""
-        if user_id not in self.requests or endpoint not in self.requests[user_id]:
-            return
-        
-        cutoff_time = time.time() - window_seconds
-        self.requests[user_id][endpoint] = [
-            (ts, count) for ts, count in self.requests[user_id][endpoint]
-            if ts > cutoff_time
-        ]
-    
-    def _get_request_count(self, user_id: str, endpoint: str) -> int:
-        """Get total request count in current window"""
-        if user_id not in self.requests or endpoint not in self.requests[user_id]:
-            return 0
-        
-        return sum(count for _, count in self.requests[user_id][endpoint])
-    
+
+    def _weighted_count(self, user_id: str, endpoint: str, window_seconds: int, now: float) -> float:
+        """Roll the windows forward and return the weighted request count"""
+        window_start = now - (now % window_seconds)
+        state = self.windows[user_id].get(endpoint)
+
+        if state is None:
+            state = [0, 0, window_start]
+            self.windows[user_id][endpoint] = state
+        elif state[2] != window_start:
+            # Shift: current window becomes previous unless a full window
+            # has gone by untouched
+            state[0] = state[1] if window_start - state[2] < 2 * window_seconds else 0
+            state[1] = 0
+            state[2] = window_start
+
+        overlap = (window_seconds - (now - window_start)) / window_seconds
+        return state[1] + state[0] * overlap
+
     def check_rate_limit(
-        self, 
-        user_id: str, 
+        self,
+        user_id: str,
         endpoint: str,
         increment: bool = True
     ) -> Tuple[bool, Dict[str, any]]:
         """
         Check if request is within rate limit.
-        
+
         Args:
             user_id: User identifier (hashed)
             endpoint: API endpoint
             increment: Whether to increment counter
-            
+
         Returns:
             (allowed, info_dict)
         """
         # Get limit config for endpoint
         limit_count, window_seconds = self.limits.get(
-            endpoint, 
+            endpoint,
             self.limits["default"]
         )
-        
-        # Cleanup old requests
-        self._cleanup_old_requests(user_id, endpoint, window_seconds)
-        
-        # Get current count
-        current_count = self._get_request_count(user_id, endpoint)
-        
+
+        now = time.time()
+        weighted = self._weighted_count(user_id, endpoint, window_seconds, now)
+        state = self.windows[user_id][endpoint]
+
         # Track in Prometheus
-        rate_limit_window_requests.labels(endpoint=endpoint).observe(current_count)
-        
+        rate_limit_window_requests.labels(endpoint=endpoint).observe(weighted)
+
         # Check limit
-        if current_count >= limit_count:
+        if weighted >= limit_count:
             user_id_hash = hashlib.sha256(user_id.encode()).hexdigest()[:16]
             rate_limit_exceeded_total.labels(
-                endpoint=endpoint, 
+                endpoint=endpoint,
                 user_id_hash=user_id_hash
             ).inc()
-            
+
             logger.warning(
                 f"rate_limit_exceeded - user_id_hash={user_id_hash}, "
-                f"endpoint={endpoint}, count={current_count}, limit={limit_count}"
+                f"endpoint={endpoint}, count={weighted:.1f}, limit={limit_count}"
             )
-            
-            # Calculate retry_after
-            if self.requests[user_id][endpoint]:
-                oldest_ts = self.requests[user_id][endpoint][0][0]
-                retry_after = int(window_seconds - (time.time() - oldest_ts)) + 1
+
+            # Time for the previous window's weight to decay below the limit,
+            # or until the current window rolls over
+            excess = weighted - limit_count + 1
+            if state[0] > 0:
+                retry_after = int(excess * window_seconds / state[0]) + 1
             else:
-                retry_after = window_seconds
-            
+                retry_after = int(state[2] + window_seconds - now) + 1
+
             return False, {
                 "allowed": False,
                 "limit": limit_count,
                 "remaining": 0,
-                "reset": int(time.time() + retry_after),
+                "reset": int(now + retry_after),
                 "retry_after": retry_after
             }
-        
-        # Increment counter if allowed
+
+        # Count the request if allowed
         if increment:
-            self.requests[user_id][endpoint].append((time.time(), 1))
-        
-        remaining = limit_count - current_count - (1 if increment else 0)
-        
+            state[1] += 1
+
+        remaining = limit_count - int(weighted) - (1 if increment else 0)
+
         return True, {
             "allowed": True,
             "limit": limit_count,
             "remaining": remaining,
-            "reset": int(time.time() + window_seconds),
+            "reset": int(state[2] + window_seconds),
             "retry_after": 0
         }
-    
+
     def get_user_stats(self, user_id: str) -> Dict[str, any]:
         """Get rate limit stats for a user"""
-        if user_id not in self.requests:
+        if user_id not in self.windows:
             return {}
-        
+
         stats = {}
-        for endpoint, requests in self.requests[user_id].items():
+        for endpoint in list(self.windows[user_id]):
             limit_count, window_seconds = self.limits.get(
-                endpoint, 
+                endpoint,
                 self.limits["default"]
             )
-            
-            self._cleanup_old_requests(user_id, endpoint, window_seconds)
-            current_count = self._get_request_count(user_id, endpoint)
-            
+
+            weighted = self._weighted_count(user_id, endpoint, window_seconds, time.time())
+
             stats[endpoint] = {
-                "count": current_count,
+                "count": int(weighted),
                 "limit": limit_count,
                 "window_seconds": window_seconds
             }
-        
+
         return stats
 
 
@@ -152,43 +154,58 @@ class InMemoryRateLimiter:
 rate_limiter = InMemoryRateLimiter()
 
 
-def get_rate_limit_key(request: Request) -> str:
+def get_rate_limit_key(scope: dict) -> str:
     """
-    Extract rate limit key from request.
-    Uses user_id from JWT if available, otherwise IP address.
+    Extract rate limit key from an ASGI scope.
+    Uses the verified JWT sub if the token checks out, otherwise IP address.
     """
-    # Try to get user_id from state (set by auth middleware)
-    user_id = getattr(request.state, "user_id", None)
-    
-    if user_id:
-        return f"user:{user_id}"
-    
+    # The key must come from a *verified* decode: the middleware's unverified
+    # parse (kept for logging context) would let any client mint a fresh sub
+    # per request - a private bucket that bypasses every per-user limit - or
+    # forge a victim's sub to fill their bucket. The verified decode is a
+    # cached dict hit for any token already seen by the auth dependency.
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            if value[:7] == b"Bearer ":
+                try:
+                    claims = decode_jwt_claims(value[7:].decode())
+                except (jwt.InvalidTokenError, UnicodeDecodeError):
+                    break
+                sub = claims.get("sub")
+                if sub:
+                    return f"user:{sub}"
+            break
+
     # Fallback to IP address
-    client_ip = request.client.host if request.client else "unknown"
-    forwarded = request.headers.get("X-Forwarded-For")
-    if forwarded:
-        client_ip = forwarded.split(",")[0].strip()
-    
+    client = scope.get("client")
+    client_ip = client[0] if client else "unknown"
+    for name, value in scope["headers"]:
+        if name == b"x-forwarded-for":
+            client_ip = value.decode("latin-1").split(",")[0].strip()
+            break
+
     return f"ip:{client_ip}"
 
 
-async def check_rate_limit(request: Request, endpoint: str = None):
+async def check_rate_limit(scope: dict, endpoint: str = None):
     """
     Middleware function to check rate limit.
     Raises HTTPException if limit exceeded.
     """
     # Determine endpoint
     if endpoint is None:
-        endpoint = request.url.path
-    
+        endpoint = scope["path"]
+
     # Get rate limit key
-    rate_key = get_rate_limit_key(request)
-    
+    rate_key = get_rate_limit_key(scope)
+
     # Check limit
     allowed, info = rate_limiter.check_rate_limit(rate_key, endpoint)
-    
-    # Set headers
-    request.state.rate_limit_info = info
+
+    # Expose for response headers
+    m = scope.get("state", {}).get("m")
+    if m is not None:
+        m.rate_limit_info = info
     
     if not allowed:
         logger.warning(
@@ -1,12 +1,15 @@
 from fastapi import APIRouter, HTTPException, Depends, Header, Cookie, BackgroundTasks
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+import orjson
 from typing import List, Optional
 from langchain_core.messages import HumanMessage, AIMessage
 from agent.graph import agent_graph
 from agent.cache_manager import cache_manager
 from agent.chat_manager import chat_manager
 from agent.state import AgentState
-from database.client import get_access_token
+from api.auth_cache import decode_jwt_claims, invalidate_token
+from database.client import get_access_token, refresh_access_token
 from logs.log import logger, set_trace_id, set_request_id, set_user_id, clear_context
 from metrics.prometheus import (
     track_http_request, requests_per_user, 
@@ -14,6 +17,7 @@ from metrics.prometheus import (
     active_chats_gauge, chat_messages_total
 )
 from config import settings
+import asyncio
 import time
 import jwt
 import hashlib
@@ -27,6 +31,11 @@ router = APIRouter()
 # REQUEST/RESPONSE MODELS
 # ============================================================================
 
+class LoginRequest(BaseModel):
+    email: str
+    password: str
+
+
 class ChatRequest(BaseModel):
     message: str
     chat_id: Optional[str] = None
@@ -62,6 +71,12 @@ class UserMetricsResponse(BaseModel):
     last_activity: Optional[str]  # Now properly typed as Optional[str]
 
 
+class BootstrapResponse(BaseModel):
+    chats: Optional[List[dict]] = None
+    history_total: Optional[int] = None
+    metrics: Optional[dict] = None
+
+
 class SystemMetricsResponse(BaseModel):
     total_chats: int
     total_users: int
@@ -93,15 +108,9 @@ async def authenticate_user(
 
 
 async def get_user_from_token(access_token: str) -> str:
-    """Extract user ID from JWT token"""
+    """Extract user ID from JWT token (verified claims cached by token hash)"""
     try:
-        decoded = jwt.decode(
-            access_token,
-            settings.JWT_SECRET,
-            algorithms=["HS256"],
-            audience="authenticated",
-            options={"verify_aud": True}
-        )
+        decoded = decode_jwt_claims(access_token)
         return decoded.get("sub")
     except jwt.InvalidTokenError as e:
         logger.error(f"token_decode_error - error={e}")
@@ -130,14 +139,18 @@ async def background_save_chat(chat_id: str, access_token: str, refresh_token: s
 # ============================================================================
 
 @router.post("/auth/login")
-async def login(email: str, password: str):
-    """Authenticate user and return tokens"""
+async def login(request: LoginRequest):
+    """Authenticate user and return tokens.
+
+    Credentials travel in the JSON body, not query params, so they never
+    land in proxy/access logs or URL caches.
+    """
     start_time = time.time()
     set_trace_id()
     set_request_id()
-    
+
     try:
-        access_token, refresh_token = await get_access_token(email, password)
+        access_token, refresh_token = await get_access_token(request.email, request.password)
         
         await track_request("/auth/login", "POST", start_time, 200)
         
@@ -157,10 +170,46 @@ async def login(email: str, password: str):
         clear_context()
 
 
+@router.post("/auth/refresh")
+async def refresh_auth_tokens(tokens: dict = Depends(authenticate_user)):
+    """Exchange the refresh token for a new token pair.
+
+    The client calls this shortly before the access token expires so
+    requests never fail with a 401 and get retried.
+    """
+    start_time = time.time()
+    set_trace_id()
+    set_request_id()
+
+    try:
+        new_access, new_refresh = await refresh_access_token(tokens["refresh_token"])
+
+        # The old token's cached claims won't be looked up again
+        invalidate_token(tokens["access_token"])
+
+        await track_request("/auth/refresh", "POST", start_time, 200)
+
+        return {
+            "access_token": new_access,
+            "refresh_token": new_refresh,
+            "token_type": "bearer"
+        }
+    except HTTPException as e:
+        await track_request("/auth/refresh", "POST", start_time, e.status_code)
+        raise
+    except Exception as e:
+        logger.error(f"refresh_error - error={e}", exc_info=True)
+        await track_request("/auth/refresh", "POST", start_time, 500)
+        raise HTTPException(status_code=500, detail="Token refresh failed")
+    finally:
+        clear_context()
+
+
 @router.post("/chat", response_model=ChatResponse)
 async def chat(
     request: ChatRequest,
     background_tasks: BackgroundTasks,
+    stream: bool = False,
     tokens: dict = Depends(authenticate_user)
 ):
     """Process chat message with auto-save"""
@@ -200,10 +249,6 @@ async def chat(
             # Create cache session
             cache_manager.create_chat_session(chat_id, user_id, chat_info['session_id'])
         
-        # Track active chats
-        active_chats_gauge.inc()
-        user_sessions_active.inc()
-        
         # Get cached messages
         cached_messages = chat_manager.get_cached_messages(chat_id)
         
@@ -241,9 +286,47 @@ async def chat(
             "results": []
         }
         
-        # Run agent
+        if stream:
+            # SSE: emit model deltas as they arrive so the client can render
+            # tokens progressively instead of waiting for the full answer
+            logger.info(f"agent_stream_start - chat_id={chat_id}")
+
+            async def event_stream():
+                parts = []
+                try:
+                    with active_chats_gauge.track_inprogress(), user_sessions_active.track_inprogress():
+                        async for event in agent_graph.astream_events(
+                            initial_state, config, version="v2"
+                        ):
+                            if event["event"] == "on_chat_model_stream":
+                                delta = event["data"]["chunk"].content
+                                if delta:
+                                    parts.append(delta)
+                                    yield b"data: " + orjson.dumps({"delta": delta}) + b"\n\n"
+                    yield b"data: " + orjson.dumps({
+                        "done": True,
+                        "response": "".join(parts),
+                        "chat_id": chat_id,
+                        "session_id": chat_info['session_id'],
+                        "is_new_chat": is_new_chat
+                    }) + b"\n\n"
+                except Exception as e:
+                    logger.error(f"chat_stream_error - error={e}", exc_info=True)
+                    yield b"data: " + orjson.dumps({"error": str(e)}) + b"\n\n"
+                finally:
+                    # BackgroundTasks run after the response object returns,
+                    # not after the stream finishes, so save here instead
+                    await background_save_chat(chat_id, access_token, refresh_token)
+
+            await track_request("/chat", "POST", start_time, 200)
+            return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+        # Run agent; track_inprogress pairs the gauge inc/dec around the
+        # in-flight window even when the agent raises, so the gauges can't
+        # drift from a missed dec on an error path
         logger.info(f"agent_invoke_start - chat_id={chat_id}")
-        result = await agent_graph.ainvoke(initial_state, config)
+        with active_chats_gauge.track_inprogress(), user_sessions_active.track_inprogress():
+            result = await agent_graph.ainvoke(initial_state, config)
         
         # Extract response
         ai_response = result["messages"][-1].content if result["messages"] else "No response"
@@ -271,8 +354,6 @@ async def chat(
         await track_request("/chat", "POST", start_time, 500)
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        active_chats_gauge.dec()
-        user_sessions_active.dec()
         clear_context()
 
 
@@ -296,7 +377,7 @@ async def end_chat(
             tokens["refresh_token"]
         )
         
-        await track_request(f"/chat/{chat_id}/end", "POST", start_time, 200)
+        await track_request("/chat/{chat_id}/end", "POST", start_time, 200)
         
         return {
             "status": "success",
@@ -306,7 +387,7 @@ async def end_chat(
         
     except Exception as e:
         logger.error(f"end_chat_error - error={e}", exc_info=True)
-        await track_request(f"/chat/{chat_id}/end", "POST", start_time, 500)
+        await track_request("/chat/{chat_id}/end", "POST", start_time, 500)
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         clear_context()
@@ -314,28 +395,31 @@ async def end_chat(
 
 @router.get("/chat/history", response_model=ChatHistoryResponse)
 async def get_chat_history(
+    limit: int = 20,
+    offset: int = 0,
     tokens: dict = Depends(authenticate_user)
 ):
-    """Get chat history for user"""
+    """Get a page of chat history for user; total covers all their chats"""
     start_time = time.time()
     set_trace_id()
-    
+
     try:
         user_id = await get_user_from_token(tokens["access_token"])
         set_user_id(user_id)
-        
-        chats = await chat_manager.load_chat_history(
+
+        chats, total = await chat_manager.load_chat_history(
             user_id,
             tokens["access_token"],
             tokens["refresh_token"],
-            limit=getattr(settings, 'CHAT_HISTORY_LIMIT', 50)
+            limit=limit,
+            offset=offset
         )
-        
+
         await track_request("/chat/history", "GET", start_time, 200)
-        
+
         return ChatHistoryResponse(
             chats=chats,
-            total=len(chats)
+            total=total
         )
         
     except Exception as e:
@@ -349,25 +433,27 @@ async def get_chat_history(
 @router.get("/chat/{chat_id}/messages", response_model=MessageHistoryResponse)
 async def get_chat_messages(
     chat_id: str,
+    since: Optional[str] = None,
     tokens: dict = Depends(authenticate_user)
 ):
-    """Get messages for a specific chat"""
+    """Get messages for a chat; `since` returns only the delta after that timestamp"""
     start_time = time.time()
     set_trace_id()
-    
+
     try:
         user_id = await get_user_from_token(tokens["access_token"])
         set_user_id(user_id)
-        
+
         messages = await chat_manager.load_chat_messages(
             chat_id,
             user_id,
             tokens["access_token"],
             tokens["refresh_token"],
-            limit=getattr(settings, 'MESSAGE_HISTORY_LIMIT', 100)
+            limit=getattr(settings, 'MESSAGE_HISTORY_LIMIT', 100),
+            since=since
         )
         
-        await track_request(f"/chat/{chat_id}/messages", "GET", start_time, 200)
+        await track_request("/chat/{chat_id}/messages", "GET", start_time, 200)
         
         return MessageHistoryResponse(
             messages=messages,
@@ -377,7 +463,7 @@ async def get_chat_messages(
         
     except Exception as e:
         logger.error(f"get_messages_error - error={e}", exc_info=True)
-        await track_request(f"/chat/{chat_id}/messages", "GET", start_time, 500)
+        await track_request("/chat/{chat_id}/messages", "GET", start_time, 500)
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         clear_context()
@@ -428,6 +514,74 @@ async def get_user_metrics(
         clear_context()
 
 
+@router.get("/bootstrap", response_model=BootstrapResponse)
+async def bootstrap(
+    include: str = "history,metrics",
+    limit: int = 20,
+    offset: int = 0,
+    tokens: dict = Depends(authenticate_user)
+):
+    """Combined UI payload: chat history and user metrics in one request
+
+    The Streamlit client hits this on login and refresh instead of making
+    separate /chat/history and /metrics/user calls; the selected sections
+    are fetched concurrently server-side.
+    """
+    start_time = time.time()
+    set_trace_id()
+
+    try:
+        user_id = await get_user_from_token(tokens["access_token"])
+        set_user_id(user_id)
+
+        wanted = {part.strip() for part in include.split(",") if part.strip()}
+        tasks = {}
+        if "history" in wanted:
+            tasks["history"] = chat_manager.load_chat_history(
+                user_id,
+                tokens["access_token"],
+                tokens["refresh_token"],
+                limit=limit,
+                offset=offset
+            )
+        if "metrics" in wanted:
+            tasks["metrics"] = chat_manager.get_user_metrics(
+                user_id,
+                tokens["access_token"],
+                tokens["refresh_token"]
+            )
+
+        results = await asyncio.gather(*tasks.values())
+        data = dict(zip(tasks.keys(), results))
+
+        metrics = data.get("metrics")
+        if metrics:
+            # Same datetime-to-ISO conversion as /metrics/user
+            last_activity = metrics.get('last_activity')
+            if last_activity and not isinstance(last_activity, str):
+                metrics['last_activity'] = (
+                    last_activity.isoformat()
+                    if hasattr(last_activity, 'isoformat') else str(last_activity)
+                )
+
+        await track_request("/bootstrap", "GET", start_time, 200)
+
+        chats, history_total = data.get("history") or (None, None)
+
+        return BootstrapResponse(
+            chats=chats,
+            history_total=history_total,
+            metrics=metrics
+        )
+
+    except Exception as e:
+        logger.error(f"bootstrap_error - error={e}", exc_info=True)
+        await track_request("/bootstrap", "GET", start_time, 500)
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        clear_context()
+
+
 @router.get("/metrics/system", response_model=SystemMetricsResponse)
 async def get_system_metrics(
     tokens: dict = Depends(authenticate_user)
@@ -1,6 +1,9 @@
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
+    # Server Config
+    DEBUG: bool = False
+
     # Supabase Config
     SUPABASE_URL: str
     SUPABASE_KEY: str
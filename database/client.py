@@ -1,28 +1,63 @@
 from supabase import create_client, Client
 from fastapi import FastAPI, HTTPException
-from database.utils import get_new_tokens, pg_escape
-from logs.log import logger, log_query, set_trace_id
+from api.auth_cache import decode_jwt_claims
+from database.utils import get_new_tokens
+from logs.log import logger, log_query, set_trace_id, get_trace_id
 from metrics.prometheus import track_db_query, track_error
 from config import settings
-from typing import Tuple, List, Dict, Any, Optional
+from typing import Tuple, List, Dict, Any, Optional, Sequence
 from fastapi.concurrency import run_in_threadpool
 from psycopg import OperationalError
-import traceback
+from psycopg.rows import dict_row
+from psycopg_pool import ConnectionPool
 import psycopg
 import json
 import jwt
 import time
 
 
-# Create a Supabase client factory (sync SDK)
+# Create a Supabase client factory (sync SDK) - kept for tests
 def make_supabase_client() -> Client:
     return create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
 
 
+# Shared client instance: each create_client() builds fresh HTTP session/TLS
+# state, so reusing one keeps connections alive across sign-ins and refreshes
+_supabase_client: Client = make_supabase_client()
+
+
+def _configure_conn(conn: psycopg.Connection) -> None:
+    """Per-connection pool setup: promote statements repeated >=3 times to
+    server-side prepared statements, with a capped plan cache"""
+    conn.prepare_threshold = 3
+    conn.prepared_max = 500
+
+
+# Pooled connections: reused across queries so repeated statements hit the
+# server-side prepared-statement cache. Opened lazily on first checkout so
+# importing this module never touches the network.
+_pool = ConnectionPool(
+    kwargs={
+        "host": settings.SUPABASE_HOST,
+        "port": 5432,
+        "dbname": settings.SUPABASE_DB,
+        "user": settings.SUPABASE_USER,
+        "password": settings.POSTGRES_PASSWORD,
+        "sslmode": "require",
+        "connect_timeout": 5,
+    },
+    min_size=1,
+    max_size=10,
+    configure=_configure_conn,
+    open=False,
+)
+
+
 async def get_access_token(email: str, password: str) -> Tuple[str, str]:
     """Authenticate user and return tokens"""
-    trace_id = set_trace_id()
-    supabase = make_supabase_client()
+    set_trace_id()
+    trace_id = get_trace_id()
+    supabase = _supabase_client
 
     try:
         auth_res = await run_in_threadpool(
@@ -30,13 +65,13 @@ async def get_access_token(email: str, password: str) -> Tuple[str, str]:
             {"email": email, "password": password}
         )
     except Exception as exc:
-        logger.error(f"auth_failed - email={email}, trace_id={trace_id}", exc_info=True)
+        logger.error("auth_failed - email=%s, trace_id=%s", email, trace_id, exc_info=True)
         track_error("auth_failure", "supabase")
         raise HTTPException(status_code=500, detail="Authentication service error")
 
     session = getattr(auth_res, "session", None)
     if not session:
-        logger.info(f"auth_invalid_credentials - email={email}, trace_id={trace_id}")
+        logger.info("auth_invalid_credentials - email=%s, trace_id=%s", email, trace_id)
         track_error("invalid_credentials", "auth")
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
@@ -44,25 +79,36 @@ async def get_access_token(email: str, password: str) -> Tuple[str, str]:
     refresh_token = getattr(session, "refresh_token", None)
 
     if not access_token or not refresh_token:
-        logger.error(f"auth_missing_tokens - email={email}, trace_id={trace_id}")
+        logger.error("auth_missing_tokens - email=%s, trace_id=%s", email, trace_id)
         track_error("missing_tokens", "auth")
         raise HTTPException(status_code=500, detail="Failed to obtain tokens")
 
     logger.info(
-        f"auth_success - email={email}, uid={getattr(session.user, 'id', 'unknown')}, "
-        f"trace_id={trace_id}"
+        "auth_success - email=%s, uid=%s, trace_id=%s",
+        email, getattr(session.user, 'id', 'unknown'), trace_id
     )
     return access_token, refresh_token
 
 
+async def refresh_access_token(refresh_token: str) -> Tuple[str, str]:
+    """Exchange a refresh token for a new access/refresh token pair"""
+    return await get_new_tokens(_supabase_client, refresh_token)
+
+
 async def run_query(
     query: str,
     access_token: str,
     refresh_token: Optional[str] = None,
     *,
+    params: Optional[Sequence[Any]] = None,
     retry_on_expire: bool = True
 ) -> List[Dict[str, Any]]:
-    """Execute database query with metrics and logging"""
+    """Execute database query with metrics and logging.
+
+    Pass values via `params` rather than formatting them into `query`:
+    parameterized statements share one textual shape, so they benefit from
+    the server-side prepared-statement cache (and need no escaping).
+    """
     
     if not access_token:
         logger.error("run_query_missing_token")
@@ -70,109 +116,102 @@ async def run_query(
 
     # Determine query type for metrics
     query_type = query.strip().split()[0].upper()
-    start_time = time.time()
+    start_time = time.perf_counter()
 
     def _connect_and_exec(access_token: str) -> List[Dict[str, Any]]:
-        conn = None
-        cur = None
-        exec_start = time.time()
-        
+        exec_start = time.perf_counter()
+
         try:
-            # Decode JWT
-            decoded = jwt.decode(
-                access_token,
-                settings.JWT_SECRET,
-                algorithms=["HS256"],
-                audience="authenticated",
-                options={"verify_aud": True}
-            )
-            
+            # Decode JWT (cached by token hash)
+            decoded = decode_jwt_claims(access_token)
+
         except jwt.InvalidTokenError as e:
-            logger.error(f"invalid_jwt - error={e}")
+            logger.error("invalid_jwt - error=%s", e)
             track_error("invalid_jwt", "database")
             raise HTTPException(status_code=401, detail="Invalid access token")
-        
+
         try:
-            # Connect to database
-            conn = psycopg.connect(
-                host=settings.SUPABASE_HOST,
-                port=5432,
-                dbname=settings.SUPABASE_DB,
-                user=settings.SUPABASE_USER,
-                password=settings.POSTGRES_PASSWORD,
-                sslmode="require",
-                connect_timeout=5
-            )
-        
-            cur = conn.cursor()
-
-            # Set role and JWT claims
-            cur.execute("SET ROLE authenticated;")
-            jwt_claims_json = json.dumps(decoded)
-            decoded_claims = jwt_claims_json.replace("'", "''")
-            cur.execute(f"SET LOCAL request.jwt.claims = '{decoded_claims}';")
-
-            # Execute query
-            cur.execute(query)
-            
-            # Commit for INSERT/UPDATE/DELETE
-            if cur.description is None:
-                conn.commit()
-                execution_time = (time.time() - exec_start) * 1000
-                
-                # Log and track metrics
-                log_query(query, execution_time, 0)
-                track_db_query(query_type, execution_time / 1000, 0, success=True)
-                
-                return []
-
-            # SELECT or INSERT ... RETURNING rows
-            rows = cur.fetchall()
-            conn.commit()
-
-            # Convert rows to list[dict]
-            desc = [col.name for col in cur.description] if cur.description else []
-            result: List[Dict[str, Any]] = []
-            for row in rows:
-                row_dict = {desc[i]: row[i] for i in range(len(desc))}
-                result.append(row_dict)
-
-            execution_time = (time.time() - exec_start) * 1000
-            
-            # Log and track metrics
-            log_query(query, execution_time, len(result))
-            track_db_query(query_type, execution_time / 1000, len(result), success=True)
-            
-            return result
-            
+            # Check out a pooled connection (no-op open if already running).
+            # Role and claims are transaction-local, so nothing leaks back
+            # into the pool on return.
+            _pool.open()
+            with _pool.connection() as conn:
+                # dict_row returns rows as dicts directly from C code,
+                # skipping the per-cell Python conversion loop
+                with conn.cursor(row_factory=dict_row) as cur:
+                    # Set role + JWT claims + query in one pipelined
+                    # round-trip. set_config() with parameter binding replaces
+                    # the manual quote-escaped SET LOCAL string.
+                    jwt_claims_json = json.dumps(decoded)
+                    with conn.pipeline():
+                        cur.execute("SET LOCAL ROLE authenticated;")
+                        cur.execute(
+                            "SELECT set_config('request.jwt.claims', %s, true);",
+                            (jwt_claims_json,)
+                        )
+                        if query_type != "SELECT":
+                            cur.execute(query, params)
+
+                    if query_type == "SELECT":
+                        # Server-side (named) cursor: rows arrive in itersize
+                        # batches, so peak memory is one batch instead of the
+                        # full result set held twice.
+                        with conn.cursor(name="run_query_cursor", row_factory=dict_row) as scur:
+                            scur.itersize = 1000
+                            scur.execute(query, params)
+                            result: List[Dict[str, Any]] = list(scur)
+
+                        execution_time = (time.perf_counter() - exec_start) * 1000
+
+                        # Log and track metrics
+                        log_query(query, execution_time, len(result))
+                        track_db_query(query_type, execution_time / 1000, len(result), success=True)
+
+                        return result
+
+                    # INSERT/UPDATE/DELETE without RETURNING
+                    if cur.description is None:
+                        execution_time = (time.perf_counter() - exec_start) * 1000
+
+                        # Log and track metrics
+                        log_query(query, execution_time, 0)
+                        track_db_query(query_type, execution_time / 1000, 0, success=True)
+
+                        return []
+
+                    # INSERT/UPDATE/DELETE ... RETURNING rows
+                    result: List[Dict[str, Any]] = cur.fetchall()
+
+                    execution_time = (time.perf_counter() - exec_start) * 1000
+
+                    # Log and track metrics
+                    log_query(query, execution_time, len(result))
+                    track_db_query(query_type, execution_time / 1000, len(result), success=True)
+
+                    return result
+
         except OperationalError as oe:
-            execution_time = (time.time() - exec_start) * 1000
-            logger.error(f"db_operational_error - error={oe}, time={execution_time}ms")
+            execution_time = (time.perf_counter() - exec_start) * 1000
+            logger.error("db_operational_error - error=%s, time=%sms", oe, execution_time)
             track_db_query(query_type, execution_time / 1000, 0, success=False)
             track_error("operational_error", "database")
             raise
-            
+
         except Exception as exc:
-            execution_time = (time.time() - exec_start) * 1000
-            logger.error(f"db_query_error - error={exc}, time={execution_time}ms", exc_info=True)
+            execution_time = (time.perf_counter() - exec_start) * 1000
+            logger.error("db_query_error - error=%s, time=%sms", exc, execution_time, exc_info=True)
             track_db_query(query_type, execution_time / 1000, 0, success=False)
             track_error("query_error", "database")
             raise HTTPException(status_code=500, detail="Error executing query")
 
-        finally:
-            if cur is not None:
-                cur.close()
-            if conn is not None:
-                conn.close()
-
     try:
         result = await run_in_threadpool(_connect_and_exec, access_token)
-        total_time = (time.time() - start_time) * 1000
-        logger.info(f"query_success - rows={len(result)}, total_time={total_time:.2f}ms")
+        total_time = (time.perf_counter() - start_time) * 1000
+        logger.info("query_success - rows=%s, total_time=%.2fms", len(result), total_time)
         return result
 
     except OperationalError as oe:
-        logger.warning(f"db_auth_error - attempting_token_refresh - error={oe}")
+        logger.warning("db_auth_error - attempting_token_refresh - error=%s", oe)
         
         if not refresh_token or not retry_on_expire:
             logger.error("token_refresh_unavailable - aborting")
@@ -182,7 +221,7 @@ async def run_query(
         # Attempt token refresh
         logger.info("token_refresh_attempt")
         try:
-            new_access, new_refresh = await get_new_tokens(make_supabase_client(), refresh_token)
+            new_access, new_refresh = await get_new_tokens(_supabase_client, refresh_token)
             if not new_access:
                 logger.error("token_refresh_failed - no_new_token")
                 track_error("token_refresh_failed", "database")
@@ -191,26 +230,26 @@ async def run_query(
             # Retry with new token
             try:
                 result = await run_in_threadpool(_connect_and_exec, new_access)
-                total_time = (time.time() - start_time) * 1000
+                total_time = (time.perf_counter() - start_time) * 1000
                 logger.info(
-                    f"query_success_after_refresh - rows={len(result)}, "
-                    f"total_time={total_time:.2f}ms"
+                    "query_success_after_refresh - rows=%s, total_time=%.2fms",
+                    len(result), total_time
                 )
                 return result
             except OperationalError as oe2:
-                logger.error(f"db_auth_failed_after_refresh - error={oe2}", exc_info=True)
+                logger.error("db_auth_failed_after_refresh - error=%s", oe2, exc_info=True)
                 track_error("auth_failed_after_refresh", "database")
                 raise HTTPException(status_code=401, detail="Database auth failed after token refresh")
                 
         except HTTPException:
             raise
         except Exception as exc:
-            logger.error(f"token_refresh_exception - error={exc}", exc_info=True)
+            logger.error("token_refresh_exception - error=%s", exc, exc_info=True)
             track_error("token_refresh_exception", "database")
             raise HTTPException(status_code=500, detail="Failed to refresh access token")
 
     except Exception as exc:
-        total_time = (time.time() - start_time) * 1000
-        logger.error(f"query_unexpected_error - error={exc}, time={total_time:.2f}ms", exc_info=True)
+        total_time = (time.perf_counter() - start_time) * 1000
+        logger.error("query_unexpected_error - error=%s, time=%.2fms", exc, total_time, exc_info=True)
         track_error("unexpected_error", "database")
         raise HTTPException(status_code=500, detail="Unexpected error executing query")
\ No newline at end of file
@@ -4,7 +4,6 @@ from supabase import Client
 from logs.log import logger
 from pydantic import BaseModel
 from typing import Tuple
-import traceback
 
 async def get_new_tokens(supabase: Client, refresh_token: str):
     if not refresh_token:
@@ -33,8 +32,8 @@ async def get_new_tokens(supabase: Client, refresh_token: str):
         raise
 
     except Exception as exc:
-        tb = traceback.format_exc()
-        logger.exception("Unexpected error while refreshing tokens: %s", tb)
+        # logger.exception already renders the traceback via exc_info
+        logger.exception("Unexpected error while refreshing tokens: %s", exc)
         raise HTTPException(status_code=500, detail="Unexpected error while refreshing session")
     
 def pg_escape(value: str) -> str:
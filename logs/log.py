@@ -1,17 +1,30 @@
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 import os
-import json
-import hashlib
+import queue
+import orjson
+from blake3 import blake3
 import uuid
 from datetime import datetime
+from functools import lru_cache
 from typing import Optional, Dict, Any
 import contextvars
+from config import settings
 
-# Context variables for request tracking
-trace_id_var = contextvars.ContextVar('trace_id', default=None)
-request_id_var = contextvars.ContextVar('request_id', default=None)
-user_id_var = contextvars.ContextVar('user_id', default=None)
+class RequestContext:
+    """Mutable per-request identifiers held in a single contextvar slot"""
+    __slots__ = ("trace_id", "request_id", "user_id")
+
+    def __init__(self, trace_id=None, request_id=None, user_id=None):
+        self.trace_id = trace_id
+        self.request_id = request_id
+        self.user_id = user_id
+
+
+# One context variable instead of three: each .set() forces a copy of the
+# task's context mapping, so binding a single RequestContext per request
+# (and mutating it in place for user_id) cuts that to one write
+request_ctx_var: contextvars.ContextVar = contextvars.ContextVar('request_ctx', default=None)
 
 LOG_DIR = "logs"
 os.makedirs(LOG_DIR, exist_ok=True)
@@ -20,14 +33,17 @@ class ProductionFormatter(logging.Formatter):
     """Production-level structured formatter with trace_id, request_id, user_id"""
     
     def format(self, record):
-        # Get context variables
-        trace_id = trace_id_var.get()
-        request_id = request_id_var.get()
-        user_id = user_id_var.get()
-        
-        # Create structured log entry
+        # Context ids ride on the record itself (stamped by ContextLogger /
+        # ContextQueueHandler.prepare on the emitting thread) - this may run
+        # on the listener thread, where the contextvar is unset
+        trace_id = getattr(record, "trace_id", None)
+        request_id = getattr(record, "request_id", None)
+        user_id = getattr(record, "user_id", None)
+
+        # Create structured log entry (orjson serializes the datetime
+        # directly via OPT_NAIVE_UTC/OPT_UTC_Z, no isoformat() string work)
         log_data = {
-            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "timestamp": datetime.utcnow(),
             "level": record.levelname,
             "logger": record.name,
             "module": record.module,
@@ -47,12 +63,20 @@ class ProductionFormatter(logging.Formatter):
         if hasattr(record, 'extra_data'):
             log_data["extra"] = record.extra_data
         
-        return json.dumps(log_data)
+        return orjson.dumps(
+            log_data,
+            default=str,
+            option=orjson.OPT_UTC_Z | orjson.OPT_NAIVE_UTC
+        ).decode()
     
     @staticmethod
+    @lru_cache(maxsize=4096)
     def _hash_user_id(user_id: str) -> str:
-        """Hash user_id for privacy"""
-        return hashlib.sha256(user_id.encode()).hexdigest()[:16]
+        """Hash user_id for privacy (memoized - same id recurs across records)"""
+        # blake3 beats sha256 on short inputs; these are fingerprints, not
+        # secrets, so cryptographic strength beyond collision resistance is
+        # unused anyway
+        return blake3(user_id.encode()).hexdigest(length=8)
 
 
 class ContextLogger(logging.LoggerAdapter):
@@ -60,11 +84,12 @@ class ContextLogger(logging.LoggerAdapter):
     
     def process(self, msg, kwargs):
         # Add context to extra
+        ctx = request_ctx_var.get()
         extra = kwargs.get('extra', {})
         extra.update({
-            'trace_id': trace_id_var.get(),
-            'request_id': request_id_var.get(),
-            'user_id': user_id_var.get(),
+            'trace_id': ctx.trace_id if ctx else None,
+            'request_id': ctx.request_id if ctx else None,
+            'user_id': ctx.user_id if ctx else None,
         })
         kwargs['extra'] = extra
         return msg, kwargs
@@ -99,49 +124,141 @@ console_handler = logging.StreamHandler()
 console_handler.setFormatter(console_formatter)
 console_handler.setLevel(logging.DEBUG)
 
-# Create base logger
+# Queue-based emission: records are buffered in memory and drained to the
+# file/console handlers on a dedicated thread, so request paths never block
+# on disk writes or the 10MB rotation copy.
+
+class ContextQueueHandler(QueueHandler):
+    """QueueHandler that carries records across threads intact.
+
+    The stock prepare() renders the record with this handler's own
+    formatter on the emitting thread and nulls exc_info/exc_text, which
+    would glue tracebacks into the message and leave ProductionFormatter
+    with no exception (and, on the listener thread, no request context).
+    Instead: stamp the context ids here - while the contextvar is still
+    bound - freeze the message, and keep exc_info so each listener-side
+    handler formats the record with its own formatter.
+    """
+
+    def prepare(self, record):
+        ctx = request_ctx_var.get()
+        if ctx is not None:
+            if getattr(record, "trace_id", None) is None:
+                record.trace_id = ctx.trace_id
+            if getattr(record, "request_id", None) is None:
+                record.request_id = ctx.request_id
+            if getattr(record, "user_id", None) is None:
+                record.user_id = ctx.user_id
+        # Merge args now in case a caller mutates them after emitting; the
+        # record never leaves the process, so exc_info needs no pickling
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+_log_queue: queue.SimpleQueue = queue.SimpleQueue()
+queue_handler = ContextQueueHandler(_log_queue)
+
+log_listener = QueueListener(
+    _log_queue,
+    app_handler,
+    error_handler,
+    console_handler,
+    respect_handler_level=True
+)
+log_listener.start()
+
+# Create base logger (level from settings: INFO in dev, WARNING in prod
+# drops the per-request records before any formatting happens - %-style
+# arguments are never interpolated for records below the effective level)
 base_logger = logging.getLogger("app_logger")
-base_logger.setLevel(logging.INFO)
-base_logger.addHandler(app_handler)
-base_logger.addHandler(error_handler)
-base_logger.addHandler(console_handler)
+base_logger.setLevel(getattr(logging, settings.LOG_LEVEL.upper(), logging.INFO))
+base_logger.addHandler(queue_handler)
 
 # Create context-aware logger
 logger = ContextLogger(base_logger, {})
 
 
 # Context management functions
-def set_trace_id(trace_id: Optional[str] = None):
-    """Set trace ID for current context"""
-    if trace_id is None:
-        trace_id = str(uuid.uuid4())
-    trace_id_var.set(trace_id)
-    return trace_id
+def push_context(
+    trace_id: Optional[str] = None,
+    request_id: Optional[str] = None
+) -> contextvars.Token:
+    """Bind a fresh request context in one contextvar write.
 
+    Later identifiers (user_id once the token is parsed) mutate the bound
+    object instead of touching the contextvar again.
+    """
+    return request_ctx_var.set(RequestContext(
+        trace_id or str(uuid.uuid4()),
+        request_id or str(uuid.uuid4()),
+    ))
 
-def set_request_id(request_id: Optional[str] = None):
-    """Set request ID for current context"""
-    if request_id is None:
-        request_id = str(uuid.uuid4())
-    request_id_var.set(request_id)
-    return request_id
 
+def set_trace_id(trace_id: Optional[str] = None) -> Optional[contextvars.Token]:
+    """Set trace ID on the current context, binding one if none exists"""
+    ctx = request_ctx_var.get()
+    if ctx is None:
+        return request_ctx_var.set(RequestContext(trace_id=trace_id or str(uuid.uuid4())))
+    ctx.trace_id = trace_id or str(uuid.uuid4())
+    return None
 
-def set_user_id(user_id: str):
-    """Set user ID for current context"""
-    user_id_var.set(user_id)
+
+def set_request_id(request_id: Optional[str] = None) -> Optional[contextvars.Token]:
+    """Set request ID on the current context, binding one if none exists"""
+    ctx = request_ctx_var.get()
+    if ctx is None:
+        return request_ctx_var.set(RequestContext(request_id=request_id or str(uuid.uuid4())))
+    ctx.request_id = request_id or str(uuid.uuid4())
+    return None
+
+
+def set_user_id(user_id: str) -> Optional[contextvars.Token]:
+    """Set user ID on the current context, binding one if none exists"""
+    ctx = request_ctx_var.get()
+    if ctx is None:
+        return request_ctx_var.set(RequestContext(user_id=user_id))
+    ctx.user_id = user_id
+    return None
+
+
+def get_trace_id() -> Optional[str]:
+    """Get trace ID for current context"""
+    ctx = request_ctx_var.get()
+    return ctx.trace_id if ctx else None
+
+
+def get_request_id() -> Optional[str]:
+    """Get request ID for current context"""
+    ctx = request_ctx_var.get()
+    return ctx.request_id if ctx else None
+
+
+def reset_context(*tokens: Optional[contextvars.Token]):
+    """Restore context variables via the Tokens returned by push_context/set_*.
+
+    Cheaper than rebinding everything to None and correctly scoped under
+    nested contexts.
+    """
+    for tok in tokens:
+        if tok is not None:
+            tok.var.reset(tok)
 
 
 def clear_context():
-    """Clear all context variables"""
-    trace_id_var.set(None)
-    request_id_var.set(None)
-    user_id_var.set(None)
+    """Clear the request context (for call sites without reset Tokens)"""
+    request_ctx_var.set(None)
+
+
+@lru_cache(maxsize=4096)
+def _hash_query(query: str) -> str:
+    """Hash query text for logging (memoized - query shapes repeat)"""
+    return blake3(query.encode()).hexdigest(length=8)
 
 
 def log_query(query: str, execution_time_ms: float, row_count: int):
     """Log database query with hashed content"""
-    query_hash = hashlib.sha256(query.encode()).hexdigest()[:16]
+    query_hash = _hash_query(query)
     logger.info(
         "db_query_executed",
         extra={
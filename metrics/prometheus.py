@@ -1,7 +1,9 @@
 from prometheus_client import Counter, Histogram, Gauge, Summary, Info
 from prometheus_client import generate_latest, REGISTRY
 from typing import Optional
+import asyncio
 import time
+import numpy as np
 
 # ============================================================================
 # REQUEST METRICS
@@ -225,22 +227,76 @@ class MetricsTimer:
         self.start_time = None
     
     def __enter__(self):
-        self.start_time = time.time()
+        # Monotonic integer clock: immune to wall-clock steps that would
+        # otherwise record negative durations in histograms
+        self.start_time = time.perf_counter_ns()
         return self
-    
+
     def __exit__(self, exc_type, exc_val, exc_tb):
-        duration = time.time() - self.start_time
+        duration = (time.perf_counter_ns() - self.start_time) / 1e9
         if self.labels:
             self.histogram.labels(**self.labels).observe(duration)
         else:
             self.histogram.observe(duration)
 
 
+# Bound label children for the per-request HTTP metrics: each .labels()
+# call rebuilds a tuple key and takes a lock on the metric's child map, so
+# hot combinations are resolved once and reused
+_http_counter_cache: dict = {}
+_http_hist_cache: dict = {}
+
+# HTTP metric events are queued and drained in batches by a background task
+# (started on app startup), so the inc/observe lock acquisitions happen off
+# the request path and outside the measured duration
+_metrics_queue: asyncio.Queue = asyncio.Queue(maxsize=10000)
+
+
 def track_http_request(method: str, endpoint: str, status: int, duration: float):
+    """Queue an HTTP request metric event (applied by the drain task)"""
+    try:
+        _metrics_queue.put_nowait((method, endpoint, status, duration))
+    except asyncio.QueueFull:
+        # Queue backed up (drain task stalled or not running): apply inline
+        # rather than drop the sample
+        _track_http_request_now(method, endpoint, status, duration)
+
+
+def drain_metrics():
+    """Apply all queued HTTP metric events"""
+    while True:
+        try:
+            method, endpoint, status, duration = _metrics_queue.get_nowait()
+        except asyncio.QueueEmpty:
+            break
+        _track_http_request_now(method, endpoint, status, duration)
+
+
+async def drain_metrics_loop(interval: float = 0.1):
+    """Background task: drain queued metric events every `interval` seconds"""
+    while True:
+        await asyncio.sleep(interval)
+        drain_metrics()
+
+
+def _track_http_request_now(method: str, endpoint: str, status: int, duration: float):
     """Track HTTP request metrics"""
-    http_requests_total.labels(method=method, endpoint=endpoint, status=status).inc()
-    http_request_duration_seconds.labels(method=method, endpoint=endpoint).observe(duration)
-    
+    key = (method, endpoint, status)
+    counter = _http_counter_cache.get(key)
+    if counter is None:
+        counter = _http_counter_cache.setdefault(
+            key, http_requests_total.labels(method=method, endpoint=endpoint, status=status)
+        )
+    counter.inc()
+
+    key = (method, endpoint)
+    hist = _http_hist_cache.get(key)
+    if hist is None:
+        hist = _http_hist_cache.setdefault(
+            key, http_request_duration_seconds.labels(method=method, endpoint=endpoint)
+        )
+    hist.observe(duration)
+
     # Track rate limit blocks
     if status == 429:
         rate_limit_blocks_total.labels(endpoint=endpoint).inc()
@@ -261,15 +317,45 @@ def track_llm_call(model: str, input_tokens: int, output_tokens: int, duration:
         llm_cost_total.labels(model=model).inc(cost)
 
 
+# Per-token (input, output) USD rates, hoisted so estimate_llm_cost does
+# not rebuild the table on every completion
+_LLM_RATES = {
+    "llama-3.3-70b-versatile": (0.00059 / 1000, 0.00079 / 1000),
+    "default": (0.0005 / 1000, 0.0015 / 1000),
+}
+
+
 def estimate_llm_cost(model: str, input_tokens: int, output_tokens: int) -> float:
     """Estimate LLM cost in USD"""
-    rates = {
-        "llama-3.3-70b-versatile": {"input": 0.00059 / 1000, "output": 0.00079 / 1000},
-        "default": {"input": 0.0005 / 1000, "output": 0.0015 / 1000}
-    }
-    
-    rate = rates.get(model, rates["default"])
-    return (input_tokens * rate["input"]) + (output_tokens * rate["output"])
+    rate_in, rate_out = _LLM_RATES.get(model, _LLM_RATES["default"])
+    return (input_tokens * rate_in) + (output_tokens * rate_out)
+
+
+def track_llm_calls_batch(models: list, in_tokens, out_tokens, durations):
+    """Track a batch of successful LLM calls in one pass.
+
+    Token and cost math runs vectorized in NumPy (one SIMD multiply-add
+    over the batch instead of N interpreted float ops), and each metric
+    child is incremented once per model rather than once per call. Use
+    this when flushing an aggregated batch, e.g. a periodic cost report.
+    """
+    in_tokens = np.asarray(in_tokens, dtype=np.float64)
+    out_tokens = np.asarray(out_tokens, dtype=np.float64)
+    durations = np.asarray(durations, dtype=np.float64)
+
+    rates_in = np.array([_LLM_RATES.get(m, _LLM_RATES["default"])[0] for m in models])
+    rates_out = np.array([_LLM_RATES.get(m, _LLM_RATES["default"])[1] for m in models])
+    costs = in_tokens * rates_in + out_tokens * rates_out
+
+    for model in set(models):
+        mask = np.fromiter((m == model for m in models), dtype=bool, count=len(models))
+        llm_requests_total.labels(model=model, status="success").inc(int(mask.sum()))
+        llm_tokens_total.labels(model=model, token_type="input").inc(float(in_tokens[mask].sum()))
+        llm_tokens_total.labels(model=model, token_type="output").inc(float(out_tokens[mask].sum()))
+        llm_cost_total.labels(model=model).inc(float(costs[mask].sum()))
+        hist = llm_request_duration_seconds.labels(model=model)
+        for d in durations[mask]:
+            hist.observe(float(d))
 
 
 def track_db_query(query_type: str, duration: float, rows: int, success: bool = True):
@@ -313,4 +399,6 @@ def track_error(error_type: str, component: str):
 
 def get_metrics():
     """Get current metrics in Prometheus format"""
+    # Flush queued events so a scrape never lags by a drain interval
+    drain_metrics()
     return generate_latest(REGISTRY)
\ No newline at end of file
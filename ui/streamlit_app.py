@@ -1,13 +1,62 @@
 import streamlit as st
-import requests
+import httpx
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import atexit
+import base64
+import orjson
 import time
 
+try:
+    # Optional: mirrors history/metrics into browser localStorage so the
+    # sidebar paints instantly on a hard refresh instead of after two
+    # round-trips
+    from streamlit_local_storage import LocalStorage
+except ImportError:
+    LocalStorage = None
+
 
 # Configuration
 API_BASE_URL = "http://localhost:8000/api"
 
+# Worker pool for issuing independent API calls in flight at once; sized for
+# the two or three fetches a refresh fans out, not for bulk work. Held in
+# cache_resource because this script re-executes top-to-bottom on every
+# rerun - a module-level pool would be rebuilt (threads and all) each time.
+@st.cache_resource
+def _get_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=4)
+
+
+def _local_storage():
+    """Browser localStorage handle, or None when the component is absent"""
+    if LocalStorage is None:
+        return None
+    if "local_storage" not in st.session_state:
+        st.session_state.local_storage = LocalStorage()
+    return st.session_state.local_storage
+
+
+def _local_get(key):
+    ls = _local_storage()
+    if ls is None:
+        return None
+    try:
+        raw = ls.getItem(key)
+        return orjson.loads(raw) if raw else None
+    except Exception:
+        return None
+
+
+def _local_set(key, value):
+    ls = _local_storage()
+    if ls is None:
+        return
+    try:
+        ls.setItem(key, orjson.dumps(value).decode())
+    except Exception:
+        pass
+
 
 def init_session_state():
     """Initialize session state variables"""
@@ -21,10 +70,112 @@ def init_session_state():
         st.session_state.current_chat_id = None
     if "messages" not in st.session_state:
         st.session_state.messages = []
+    if "messages_by_chat" not in st.session_state:
+        # Per-chat message cache: revisiting a chat only fetches the delta
+        st.session_state.messages_by_chat = {}
     if "chat_history" not in st.session_state:
-        st.session_state.chat_history = []
+        # Seed from the browser cache for an instant first paint; the
+        # authoritative fetch after login overwrites it
+        st.session_state.chat_history = _local_get("chat_history") or []
     if "user_metrics" not in st.session_state:
-        st.session_state.user_metrics = {}
+        st.session_state.user_metrics = _local_get("user_metrics") or {}
+    if "history_page_size" not in st.session_state:
+        st.session_state.history_page_size = 20
+    if "history_total" not in st.session_state:
+        st.session_state.history_total = 0
+    if "render_window" not in st.session_state:
+        # Only the most recent turns are rendered per rerun; "Load earlier"
+        # widens the window on demand
+        st.session_state.render_window = 50
+    if "pending_saves" not in st.session_state:
+        # (chat_id, future) pairs for fire-and-forget end-of-chat saves
+        st.session_state.pending_saves = []
+    if "last_refresh" not in st.session_state:
+        # Monotonic timestamp of the last full refresh, for debouncing
+        st.session_state.last_refresh = 0.0
+    if "date_fmt_cache" not in st.session_state:
+        # raw ISO string -> sidebar display string; see _fmt_date
+        st.session_state.date_fmt_cache = {}
+    if "last_saved_len" not in st.session_state:
+        # Message count per chat at its last save; lets save helpers skip
+        # the round-trip when nothing new exists
+        st.session_state.last_saved_len = {}
+    if "http" not in st.session_state:
+        # Pooled client survives Streamlit reruns (the script re-executes on
+        # every interaction), so the TCP+TLS handshake is paid once per
+        # session instead of once per API call. Kept per-session rather than
+        # process-wide so auth headers never leak between users.
+        st.session_state.http = httpx.Client(
+            base_url=API_BASE_URL,
+            timeout=30.0,
+            transport=httpx.HTTPTransport(retries=2),
+            limits=httpx.Limits(max_connections=16, max_keepalive_connections=4),
+        )
+
+
+def _loads(response):
+    """Parse a response body with orjson (C parser, ~2-3x stdlib json)"""
+    return orjson.loads(response.content)
+
+
+def _fmt_date(raw: str) -> str:
+    """Format an ISO timestamp for the sidebar, memoized in session state.
+
+    The memo lives in st.session_state because the script re-executes on
+    every rerun - an lru_cache defined here would start empty each time.
+    The same strings recur across reruns, so repeats cost a dict lookup,
+    not a parse."""
+    cache = st.session_state.date_fmt_cache
+    cached = cache.get(raw)
+    if cached is not None:
+        return cached
+    try:
+        dt = datetime.fromisoformat(raw.replace("Z", "+00:00"))
+        formatted = dt.strftime("%b %d, %H:%M")
+    except (ValueError, AttributeError):
+        formatted = "Unknown"
+    if len(cache) >= 2048:
+        cache.clear()
+    cache[raw] = formatted
+    return formatted
+
+
+def _token_expiry(access_token: str) -> float:
+    """Read the exp claim from a JWT without verifying it (display/refresh only)"""
+    try:
+        payload = orjson.loads(base64.urlsafe_b64decode(access_token.split(".")[1] + "=="))
+        return float(payload.get("exp", 0))
+    except Exception:
+        return 0.0
+
+
+def try_refresh_token() -> bool:
+    """Swap the refresh token for a new token pair"""
+    try:
+        response = st.session_state.http.post("/auth/refresh")
+        if response.status_code == 200:
+            data = _loads(response)
+            st.session_state.access_token = data["access_token"]
+            st.session_state.refresh_token = data["refresh_token"]
+            st.session_state.token_exp = _token_expiry(data["access_token"])
+            headers = st.session_state.http.headers
+            headers["Authorization"] = f"Bearer {data['access_token']}"
+            headers["X-Refresh-Token"] = data["refresh_token"]
+            return True
+        return False
+    except Exception:
+        return False
+
+
+def _ensure_fresh_token():
+    """Refresh the access token proactively, 30s before it expires.
+
+    Cheaper than letting a request 401 and retrying it: the refresh
+    happens once per expiry window instead of doubling a live call.
+    """
+    exp = st.session_state.get("token_exp", 0)
+    if exp and time.time() > exp - 30:
+        try_refresh_token()
 
 
 def handle_api_error(response):
@@ -37,16 +188,24 @@ def handle_api_error(response):
     return False
 
 
+def _chat_needs_save() -> bool:
+    """True when the current chat has messages the server hasn't seen"""
+    chat_id = st.session_state.current_chat_id
+    return (
+        st.session_state.last_saved_len.get(chat_id)
+        != len(st.session_state.messages)
+    )
+
+
 def save_current_chat():
     """Save current chat before switching or closing"""
     if st.session_state.current_chat_id and st.session_state.authenticated:
+        if not _chat_needs_save():
+            return
         try:
-            response = requests.post(
-                f"{API_BASE_URL}/chat/{st.session_state.current_chat_id}/end",
-                headers={
-                    "Authorization": f"Bearer {st.session_state.access_token}",
-                    "X-Refresh-Token": st.session_state.refresh_token
-                }
+            _ensure_fresh_token()
+            response = st.session_state.http.post(
+                f"/chat/{st.session_state.current_chat_id}/end"
             )
             
             if response.status_code == 401:
@@ -54,6 +213,10 @@ def save_current_chat():
                 return
             
             if response.status_code == 200:
+                _fetch_history.clear()
+                st.session_state.last_saved_len[st.session_state.current_chat_id] = (
+                    len(st.session_state.messages)
+                )
                 st.success("Chat saved successfully!")
             else:
                 st.warning(f"Chat save returned status {response.status_code}")
@@ -61,102 +224,285 @@ def save_current_chat():
             st.error(f"Error saving chat: {str(e)}")
 
 
+def _post_end(client, chat_id):
+    """POST the end-of-chat save (runs on the worker pool)"""
+    return client.post(f"/chat/{chat_id}/end")
+
+
+def save_current_chat_async():
+    """Queue the end-of-chat save without blocking the interaction.
+
+    Switching chats or starting a new one doesn't depend on the save
+    finishing, so it runs on the worker pool; report_pending_saves()
+    surfaces the outcome on a later rerun.
+    """
+    chat_id = st.session_state.current_chat_id
+    if not (chat_id and st.session_state.authenticated):
+        return
+    if not _chat_needs_save():
+        return
+    _ensure_fresh_token()
+    future = _get_executor().submit(_post_end, st.session_state.http, chat_id)
+    st.session_state.pending_saves.append((chat_id, future))
+    st.session_state.last_saved_len[chat_id] = len(st.session_state.messages)
+    _fetch_history.clear()
+
+
+def report_pending_saves():
+    """Toast the outcome of finished background saves; keep the rest queued"""
+    still_pending = []
+    for chat_id, future in st.session_state.pending_saves:
+        if not future.done():
+            still_pending.append((chat_id, future))
+            continue
+        try:
+            response = future.result()
+            if response.status_code != 200:
+                st.toast(f"Save of chat {chat_id[:12]}... returned {response.status_code}")
+        except Exception as e:
+            st.toast(f"Save of chat {chat_id[:12]}... failed: {e}")
+    st.session_state.pending_saves = still_pending
+
+
 def login(email: str, password: str):
     """Authenticate user"""
     try:
-        response = requests.post(
-            f"{API_BASE_URL}/auth/login",
-            params={"email": email, "password": password}
+        response = st.session_state.http.post(
+            "/auth/login",
+            content=orjson.dumps({"email": email, "password": password}),
+            headers={"Content-Type": "application/json"}
         )
         
         if response.status_code == 200:
-            data = response.json()
+            data = _loads(response)
             st.session_state.access_token = data["access_token"]
             st.session_state.refresh_token = data["refresh_token"]
+            st.session_state.token_exp = _token_expiry(data["access_token"])
+            # Bind auth to the pooled client once; call sites no longer
+            # rebuild the same two-entry dict per request
+            st.session_state.http.headers.update({
+                "Authorization": f"Bearer {data['access_token']}",
+                "X-Refresh-Token": data["refresh_token"]
+            })
             st.session_state.authenticated = True
             return True
         else:
-            st.error(f"Login failed: {response.json().get('detail', 'Unknown error')}")
+            st.error(f"Login failed: {_loads(response).get('detail', 'Unknown error')}")
             return False
     except Exception as e:
         st.error(f"Login error: {str(e)}")
         return False
 
 
+# The fetchers below are cached for 30s keyed on the tokens (the client is
+# underscore-prefixed so Streamlit skips hashing it): most reruns just
+# re-render widgets and are served from memory instead of a round-trip.
+# Mutating helpers call .clear() to invalidate after a write.
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _fetch_metrics(_client, access_token, refresh_token):
+    """Fetch user metrics (no session_state access, safe to run in a worker).
+
+    The token arguments only key the cache; auth travels via the
+    client's default headers.
+    """
+    response = _client.get("/metrics/user")
+    response.raise_for_status()
+    return _loads(response)
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _fetch_history(_client, access_token, refresh_token, limit=20):
+    """Fetch one page of the chat list; returns (chats, total).
+
+    The token arguments only key the cache; auth travels via the
+    client's default headers.
+    """
+    response = _client.get("/chat/history", params={"limit": limit})
+    response.raise_for_status()
+    data = _loads(response)
+    return data["chats"], data["total"]
+
+
 def load_user_metrics():
     """Load user metrics"""
     try:
-        response = requests.get(
-            f"{API_BASE_URL}/metrics/user",
-            headers={
-                "Authorization": f"Bearer {st.session_state.access_token}",
-                "X-Refresh-Token": st.session_state.refresh_token
-            }
+        _ensure_fresh_token()
+        st.session_state.user_metrics = _fetch_metrics(
+            st.session_state.http,
+            st.session_state.access_token,
+            st.session_state.refresh_token
         )
-        
-        if response.status_code == 401:
-            handle_api_error(response)
+        _local_set("user_metrics", st.session_state.user_metrics)
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 401:
+            handle_api_error(e.response)
             return
-        
-        if response.status_code == 200:
-            st.session_state.user_metrics = response.json()
+        st.warning(f"Could not load metrics: {str(e)}")
     except Exception as e:
         st.warning(f"Could not load metrics: {str(e)}")
 
 
 def load_chat_history():
-    """Load all chats for the user"""
+    """Load the visible page of chats for the user"""
+    try:
+        _ensure_fresh_token()
+        st.session_state.chat_history, st.session_state.history_total = _fetch_history(
+            st.session_state.http,
+            st.session_state.access_token,
+            st.session_state.refresh_token,
+            st.session_state.history_page_size
+        )
+        _local_set("chat_history", st.session_state.chat_history)
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 401:
+            handle_api_error(e.response)
+            return
+        st.error("Failed to load chat history")
+    except Exception as e:
+        st.error(f"Error loading chat history: {str(e)}")
+
+
+def _refresh_debounced() -> bool:
+    """True when a full refresh ran within the last 200ms.
+
+    Rapid clicks (three chats selected in a second, a mashed refresh
+    button) would each fan out history+metrics fetches; coalescing them
+    into one bounds the backend QPS a single session can generate.
+    """
+    now = time.monotonic()
+    if now - st.session_state.last_refresh < 0.2:
+        return True
+    st.session_state.last_refresh = now
+    return False
+
+
+def refresh_all():
+    """Load chat history and user metrics with both calls in flight at once.
+
+    The two fetches are independent, so running them on the worker pool
+    makes a refresh cost max(t_history, t_metrics) instead of the sum.
+    """
+    if _refresh_debounced():
+        return
+    _ensure_fresh_token()
+    client = st.session_state.http
+    access_token = st.session_state.access_token
+    refresh_token = st.session_state.refresh_token
+
+    executor = _get_executor()
+    hist_future = executor.submit(
+        _fetch_history, client, access_token, refresh_token,
+        st.session_state.history_page_size
+    )
+    metrics_future = executor.submit(_fetch_metrics, client, access_token, refresh_token)
+
     try:
-        response = requests.get(
-            f"{API_BASE_URL}/chat/history",
-            headers={
-                "Authorization": f"Bearer {st.session_state.access_token}",
-                "X-Refresh-Token": st.session_state.refresh_token
+        chats, total = hist_future.result()
+        metrics = metrics_future.result()
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 401:
+            handle_api_error(e.response)
+            return
+        st.error(f"Error refreshing data: {str(e)}")
+        return
+    except Exception as e:
+        st.error(f"Error refreshing data: {str(e)}")
+        return
+
+    st.session_state.chat_history = chats
+    st.session_state.history_total = total
+    st.session_state.user_metrics = metrics
+    _local_set("chat_history", chats)
+    _local_set("user_metrics", metrics)
+
+
+def bootstrap():
+    """Load chat history and user metrics in a single /bootstrap request.
+
+    Collapses the login/refresh pair of round-trips into one; falls back
+    to the parallel individual fetches if the server predates the
+    endpoint (404).
+    """
+    if _refresh_debounced():
+        return
+    try:
+        _ensure_fresh_token()
+        response = st.session_state.http.get(
+            "/bootstrap",
+            params={
+                "include": "history,metrics",
+                "limit": st.session_state.history_page_size
             }
         )
-        
+
         if response.status_code == 401:
             handle_api_error(response)
             return
-        
+
+        if response.status_code == 404:
+            # Fallback must not be swallowed by the debounce stamp the
+            # bootstrap attempt just set
+            st.session_state.last_refresh = 0.0
+            refresh_all()
+            return
+
         if response.status_code == 200:
-            data = response.json()
-            st.session_state.chat_history = data["chats"]
+            data = _loads(response)
+            if data.get("chats") is not None:
+                st.session_state.chat_history = data["chats"]
+                st.session_state.history_total = data.get("history_total") or len(data["chats"])
+                _local_set("chat_history", data["chats"])
+            if data.get("metrics") is not None:
+                st.session_state.user_metrics = data["metrics"]
+                _local_set("user_metrics", data["metrics"])
         else:
-            st.error("Failed to load chat history")
+            st.error("Failed to load data")
     except Exception as e:
-        st.error(f"Error loading chat history: {str(e)}")
+        st.error(f"Error refreshing data: {str(e)}")
 
 
 def load_chat_messages(chat_id: str):
-    """Load messages for a specific chat"""
+    """Load messages for a specific chat, fetching only the delta when cached"""
     try:
+        _ensure_fresh_token()
         if st.session_state.current_chat_id and st.session_state.current_chat_id != chat_id:
-            save_current_chat()
-        
-        response = requests.get(
-            f"{API_BASE_URL}/chat/{chat_id}/messages",
-            headers={
-                "Authorization": f"Bearer {st.session_state.access_token}",
-                "X-Refresh-Token": st.session_state.refresh_token
-            }
+            save_current_chat_async()
+
+        cached = st.session_state.messages_by_chat.get(chat_id)
+        params = {}
+        if cached:
+            last_ts = cached[-1].get("created_at")
+            if last_ts:
+                params["since"] = last_ts
+
+        response = st.session_state.http.get(
+            f"/chat/{chat_id}/messages",
+            params=params
         )
-        
+
         if response.status_code == 401:
             handle_api_error(response)
             return
-        
+
         if response.status_code == 200:
-            data = response.json()
-            st.session_state.messages = [
-                {
-                    "role": msg["role"], 
-                    "content": msg["content"],
-                    "created_at": msg.get("created_at")
-                }
-                for msg in data["messages"]
-            ]
+            data = _loads(response)
+            # The server returns exactly the keys the UI consumes, so the
+            # parsed list is used as-is - no per-message dict rebuild
+            new_messages = data["messages"]
+
+            if cached is not None:
+                cached.extend(new_messages)
+            else:
+                st.session_state.messages_by_chat[chat_id] = new_messages
+
+            # Reference assignment: appends via st.session_state.messages
+            # keep the per-chat cache current too
+            st.session_state.messages = st.session_state.messages_by_chat[chat_id]
             st.session_state.current_chat_id = chat_id
+            # Everything shown came from the server, so browsing away
+            # without sending shouldn't trigger a save
+            st.session_state.last_saved_len[chat_id] = len(st.session_state.messages)
             st.success(f"Loaded chat: {chat_id[:16]}...")
         else:
             st.error("Failed to load messages")
@@ -165,56 +511,118 @@ def load_chat_messages(chat_id: str):
 
 
 def send_message(message: str, topic: str = None):
-    """Send message to chatbot"""
+    """Send message to chatbot, streaming the reply token by token"""
     try:
-        response = requests.post(
-            f"{API_BASE_URL}/chat",
-            json={
+        _ensure_fresh_token()
+        with st.session_state.http.stream(
+            "POST",
+            "/chat",
+            params={"stream": "true"},
+            content=orjson.dumps({
                 "message": message,
                 "chat_id": st.session_state.current_chat_id,
                 "topic": topic
-            },
-            headers={
-                "Authorization": f"Bearer {st.session_state.access_token}",
-                "X-Refresh-Token": st.session_state.refresh_token
-            }
-        )
-        
-        if response.status_code == 401:
-            if not handle_api_error(response):
+            }),
+            headers={"Content-Type": "application/json"}
+        ) as response:
+            if response.status_code == 401:
+                response.read()
+                if not handle_api_error(response):
+                    return False
+
+            if response.status_code != 200:
+                response.read()
+                st.error(f"Error: {_loads(response).get('detail', 'Unknown error')}")
                 return False
-        
-        if response.status_code == 200:
-            data = response.json()
-            st.session_state.current_chat_id = data["chat_id"]
-            
-            st.session_state.messages.append({
-                "role": "user", 
-                "content": message,
-                "created_at": datetime.utcnow().isoformat()
-            })
-            st.session_state.messages.append({
-                "role": "assistant", 
-                "content": data["response"],
-                "created_at": datetime.utcnow().isoformat()
-            })
-            
-            return True
-        else:
-            st.error(f"Error: {response.json().get('detail', 'Unknown error')}")
+
+            # SSE lines: data: {"delta": ...} per token, then a final
+            # data: {"done": true, ...} carrying chat metadata
+            meta = {}
+
+            def deltas():
+                for line in response.iter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    event = orjson.loads(line[6:])
+                    if "delta" in event:
+                        yield event["delta"]
+                    elif event.get("done"):
+                        meta.update(event)
+                    elif "error" in event:
+                        raise RuntimeError(event["error"])
+
+            with st.chat_message("assistant", avatar="🤖"):
+                full = st.write_stream(deltas)
+
+        if not meta:
+            st.error("Error: stream ended unexpectedly")
             return False
+
+        st.session_state.current_chat_id = meta["chat_id"]
+        # First message of a new chat: register the live list in the
+        # per-chat cache so later revisits only fetch the delta
+        st.session_state.messages_by_chat.setdefault(
+            meta["chat_id"], st.session_state.messages
+        )
+
+        st.session_state.messages.append({
+            "role": "user",
+            "content": message,
+            "created_at": datetime.utcnow().isoformat()
+        })
+        st.session_state.messages.append({
+            "role": "assistant",
+            "content": full or meta.get("response", ""),
+            "created_at": datetime.utcnow().isoformat()
+        })
+
+        # Server state changed: drop the cached list/metrics snapshots
+        _fetch_history.clear()
+        _fetch_metrics.clear()
+
+        return True
     except Exception as e:
         st.error(f"Error sending message: {str(e)}")
         return False
 
 
+def merge_chat_history_after_send(chat_id: str, topic: str = None):
+    """Update the local chat list in place after a send.
+
+    Saves the full /chat/history round-trip on every message; the server
+    list is still fetched on login, new chat, and explicit refresh.
+    """
+    now_iso = datetime.utcnow().isoformat()
+    history = st.session_state.chat_history
+
+    for i, chat in enumerate(history):
+        if chat.get("chat_id") == chat_id:
+            chat["message_count"] = chat.get("message_count", 0) + 2
+            chat["updated_at"] = now_iso
+            # Most recently updated chat sorts first, matching the server
+            history.insert(0, history.pop(i))
+            return
+
+    # New chat: prepend a stub matching the /chat/history row shape
+    history.insert(0, {
+        "chat_id": chat_id,
+        "topic": topic or "Untitled Chat",
+        "total_tokens": 0,
+        "is_active": True,
+        "created_at": now_iso,
+        "updated_at": now_iso,
+        "message_count": 2,
+    })
+
+
 def start_new_chat():
     """Start a new chat"""
     if st.session_state.current_chat_id:
-        save_current_chat()
-    
+        save_current_chat_async()
+
     st.session_state.current_chat_id = None
     st.session_state.messages = []
+    _fetch_history.clear()
     st.success("New chat started!")
 
 
@@ -222,8 +630,9 @@ def logout():
     """Logout and save current chat"""
     save_current_chat()
     st.session_state.clear()
-    st.success("Logged out successfully!")
-    time.sleep(1)
+    # Toast survives the rerun, so no blocking sleep to keep the banner
+    # visible - a sleep here would stall the script thread for every session
+    st.toast("Logged out successfully!")
     st.rerun()
 
 
@@ -312,13 +721,21 @@ def display_chat_tab():
     else:
         st.info("👋 Start a new conversation by typing a message below!")
     
-    # Display messages
+    # Display messages - only the last render_window turns, so per-rerun
+    # widget creation stays bounded however long the conversation gets
+    messages = st.session_state.messages
+    window = st.session_state.render_window
     chat_container = st.container()
     with chat_container:
-        for message in st.session_state.messages:
+        if len(messages) > window:
+            if st.button(f"⬆️ Load earlier ({len(messages) - window} hidden)"):
+                st.session_state.render_window += 50
+                st.rerun()
+
+        for message in messages[-window:]:
             role = message["role"]
             content = message["content"]
-            
+
             if role == "user":
                 with st.chat_message("user", avatar="👤"):
                     st.write(content)
@@ -333,12 +750,17 @@ def display_chat_tab():
         topic = None
         if not st.session_state.current_chat_id:
             topic = user_input[:50]
-        
-        with st.spinner("🤔 Thinking..."):
+
+        # Render both new bubbles in this run instead of st.rerun()-ing:
+        # a rerun re-executes the whole script (sidebar, metrics, every
+        # message) just to show two lines. The appended session_state
+        # entries are picked up by the next organic rerun, and the cached
+        # fetchers refresh metrics/history on their 30s TTL.
+        with chat_container:
+            with st.chat_message("user", avatar="👤"):
+                st.write(user_input)
             if send_message(user_input, topic):
-                load_chat_history()
-                load_user_metrics()
-                st.rerun()
+                merge_chat_history_after_send(st.session_state.current_chat_id, topic)
 
 
 def main():
@@ -349,10 +771,14 @@ def main():
     )
     
     init_session_state()
-    
-    # Save chat on app close
-    if st.session_state.authenticated and st.session_state.current_chat_id:
+    report_pending_saves()
+
+    # Save chat on app close. Register once per session: the script reruns
+    # on every interaction, and an unguarded register would stack one entry
+    # (and one shutdown HTTP save) per rerun.
+    if st.session_state.authenticated and "atexit_registered" not in st.session_state:
         atexit.register(save_current_chat)
+        st.session_state.atexit_registered = True
     
     # Login screen
     if not st.session_state.authenticated:
@@ -366,8 +792,7 @@ def main():
             if submitted:
                 if login(email, password):
                     st.success("Login successful!")
-                    load_chat_history()
-                    load_user_metrics()
+                    bootstrap()
                     st.rerun()
         return
     
@@ -380,8 +805,7 @@ def main():
         col1, col2, col3 = st.columns(3)
         with col1:
             if st.button("🔄", use_container_width=True, help="Refresh"):
-                load_chat_history()
-                load_user_metrics()
+                bootstrap()
                 st.rerun()
         
         with col2:
@@ -423,14 +847,9 @@ def main():
             chat_id = chat.get("chat_id")
             topic = chat.get("topic", "Untitled Chat")
             message_count = chat.get("message_count", 0)
-            updated_at = chat.get("updated_at", "")
-            
-            try:
-                dt = datetime.fromisoformat(updated_at.replace("Z", "+00:00"))
-                date_str = dt.strftime("%b %d, %H:%M")
-            except:
-                date_str = "Unknown"
-            
+            date_str = _fmt_date(chat.get("updated_at", ""))
+
+
             is_current = chat_id == st.session_state.current_chat_id
             button_type = "primary" if is_current else "secondary"
             
@@ -444,7 +863,14 @@ def main():
                 if not is_current:
                     load_chat_messages(chat_id)
                     st.rerun()
-    
+
+        # Widget count stays O(page size) no matter how many chats exist
+        if len(st.session_state.chat_history) < st.session_state.history_total:
+            if st.button("⬇️ Load more", use_container_width=True):
+                st.session_state.history_page_size += 20
+                load_chat_history()
+                st.rerun()
+
     # Main content with tabs
     tab1, tab2 = st.tabs(["💬 Chat", "📊 Metrics"])
     